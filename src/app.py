@@ -7,7 +7,7 @@ import time
 import os
 from rag_engine import StrictRAGAssistant, create_embeddings, get_vectorstore
 import config
-from utils import logger, format_time
+from utils import logger, format_time, format_bytes, deep_getsizeof
 
 # Page Configuration
 st.set_page_config(
@@ -17,32 +17,63 @@ st.set_page_config(
 )
 
 
-def format_doc_source(doc):
+def to_provenance(doc):
     """
-    Convert a retrieved Document's metadata into a clean human-readable label.
+    Reduce a retrieved Document to a compact provenance record for chat history.
 
     Why we need this:
+    - Each retrieved chunk is ~CHUNK_SIZE characters; holding full Document
+      objects in st.session_state for every turn grows session memory without
+      bound, yet the UI only shows where each chunk came from.
     - PyPDFLoader sets doc.metadata = {"source": "/full/path/to.pdf", "page": 0}
     - Docx2txtLoader sets doc.metadata = {"source": "/full/path/to.docx"}
     - We only want the file *name* (engineers don't care about /app/data/ prefix)
       and we want page numbers to be 1-indexed for human readability.
+    - chunk_id lets us lazily re-fetch the chunk text from ChromaDB on demand.
     """
     # Default to empty string so .get(...) never returns None for basename()
     source_path = doc.metadata.get("source", "")
-    if not source_path:
-        return "Unknown source"
-
-    # Strip directory prefix so we only show e.g. "oled_book.pdf"
-    file_name = os.path.basename(source_path)
 
     # PyPDFLoader exposes 0-indexed page numbers; convert to 1-indexed.
     page = doc.metadata.get("page")
-    if page is not None:
-        return f"{file_name} (p.{page + 1})"
-    return file_name
+    return {
+        "chunk_id": doc.metadata.get("chunk_id"),
+        # Strip directory prefix so we only show e.g. "oled_book.pdf"
+        "file_name": os.path.basename(source_path) if source_path else None,
+        "page": page + 1 if page is not None else None,
+        "score": doc.metadata.get("score"),
+    }
+
+
+def format_doc_source(record):
+    """Convert a provenance record into a clean human-readable label."""
+    if not record["file_name"]:
+        return "Unknown source"
+    if record["page"] is not None:
+        return f"{record['file_name']} (p.{record['page']})"
+    return record["file_name"]
 
 
-def render_message_extras(metadata=None, docs=None):
+def append_message(message):
+    """
+    Append to chat history, keeping at most MAX_HISTORY_MESSAGES.
+
+    Trimming drops whole turns (a user message plus any replies after it),
+    so history never starts with an answer whose question was cut off, even
+    when a failed query left a user message without a reply.
+    Each message gets a stable id so widget keys survive history trimming.
+    """
+    message["id"] = st.session_state.next_message_id
+    st.session_state.next_message_id += 1
+    messages = st.session_state.messages
+    messages.append(message)
+    while len(messages) > config.MAX_HISTORY_MESSAGES:
+        del messages[0]
+        while messages and messages[0]["role"] != "user":
+            del messages[0]
+
+
+def render_message_extras(metadata=None, docs=None, key_prefix="msg"):
     """
     Render the "Analysis Details" and "Retrieved Documents" expanders.
 
@@ -54,6 +85,9 @@ def render_message_extras(metadata=None, docs=None):
     sent will look bare until the page reruns again. Centralising the render
     code here keeps both paths identical and avoids that "missing expander"
     bug on the very first render.
+
+    `docs` are provenance records (see to_provenance); chunk text is only
+    fetched from the vector store when the user toggles it open.
     """
     if metadata:
         with st.expander("Analysis Details"):
@@ -62,9 +96,18 @@ def render_message_extras(metadata=None, docs=None):
         with st.expander("Retrieved Documents"):
             # Show only the source label (file name + page) so engineers can
             # verify provenance at a glance without wading through raw chunks.
-            for i, doc in enumerate(docs, 1):
-                source_label = format_doc_source(doc)
-                st.markdown(f"**Doc {i}** — `{source_label}`")
+            for i, record in enumerate(docs, 1):
+                source_label = format_doc_source(record)
+                score = record.get("score")
+                score_text = f" | Score: {score:.3f}" if score is not None else ""
+                st.markdown(f"**Doc {i}** — `{source_label}`{score_text}")
+                # Nested expanders aren't allowed, so a toggle gates the fetch.
+                if record.get("chunk_id") and st.toggle("Show text", key=f"{key_prefix}_doc_{i}"):
+                    chunk_text = load_chunk_text(record["chunk_id"])
+                    if chunk_text:
+                        st.text(chunk_text)
+                    else:
+                        st.caption("Chunk text is no longer available in the vector store.")
 
 # Initialize Assistant (Cached to prevent reloading on every interaction)
 @st.cache_resource
@@ -81,6 +124,13 @@ def get_assistant():
         sigmoid_steepness=config.SIGMOID_STEEPNESS,
     )
 
+
+@st.cache_data(max_entries=config.CHUNK_TEXT_CACHE_ENTRIES, show_spinner=False)
+def load_chunk_text(chunk_id):
+    """Lazily load chunk text by ID (shared, bounded cache across sessions)."""
+    return assistant.get_chunk_text(chunk_id)
+
+
 try:
     if not os.environ.get("OPENAI_API_KEY"):
         st.error(
@@ -110,6 +160,8 @@ with st.sidebar:
 # Initialize chat history (must come before any UI that reads it).
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "next_message_id" not in st.session_state:
+    st.session_state.next_message_id = 0
 
 # ----------------------------------------------------------------------------
 # Resolve the active prompt FIRST, then commit the user message to history,
@@ -127,7 +179,7 @@ prompt = typed_prompt or st.session_state.pop("pending_query", None)
 # Commit the user message to history BEFORE rendering anything that depends
 # on conversation state.
 if prompt:
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    append_message({"role": "user", "content": prompt})
 
 # Main Chat Interface
 # Two columns: title on the left, "New chat" button on the right.
@@ -234,6 +286,7 @@ for message in st.session_state.messages:
         render_message_extras(
             metadata=message.get("metadata"),
             docs=message.get("docs"),
+            key_prefix=f"msg_{message.get('id')}",
         )
 
 if prompt:
@@ -285,16 +338,40 @@ if prompt:
             "relevance_score": score,
             "response_time": f"{elapsed:.2f}s",
         }
-        live_docs = result["retrieved_docs"] if mode == "RAG" else None
+        # Keep only compact provenance records; chunk text is lazy-loaded.
+        live_docs = (
+            [to_provenance(doc) for doc in result["retrieved_docs"]]
+            if mode == "RAG"
+            else None
+        )
+        # Peek the id append_message() will assign so widget keys match
+        # between this live render and later history reruns.
+        live_key_prefix = f"msg_{st.session_state.next_message_id}"
 
         # Render expanders right now so the user sees them immediately,
         # without waiting for the next Streamlit rerun.
-        render_message_extras(metadata=live_metadata, docs=live_docs)
+        render_message_extras(metadata=live_metadata, docs=live_docs, key_prefix=live_key_prefix)
 
         # Save to history so the same message keeps showing on later reruns.
-        st.session_state.messages.append({
+        append_message({
             "role": "assistant",
             "content": f"**Answer:** {answer}\n\n:{status_color}[{status_text}] | Time: {format_time(elapsed)}",
             "metadata": live_metadata,
             "docs": live_docs,
         })
+
+# Session memory report (rendered last so it reflects this run's history).
+session_bytes = deep_getsizeof(st.session_state.messages)
+with st.sidebar:
+    st.markdown("---")
+    st.markdown("**Session Memory**")
+    st.caption(
+        f"{format_bytes(session_bytes)} across {len(st.session_state.messages)} messages "
+        f"(max {config.MAX_HISTORY_MESSAGES})"
+    )
+if prompt:
+    logger.info(
+        "Session memory: %s across %d messages.",
+        format_bytes(session_bytes),
+        len(st.session_state.messages),
+    )
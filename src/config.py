@@ -23,11 +23,31 @@ CHUNK_SIZE = 3000
 CHUNK_OVERLAP = 500
 TOP_K_DOCUMENTS = 4
 
+# Vector Index (ChromaDB HNSW) Settings
+# All four are fixed when the collection is created (chromadb ignores later
+# changes on an existing index): delete chroma_db to rebuild with new values.
+# Compare settings with: python src/tune_hnsw.py
+HNSW_SPACE = os.getenv("HNSW_SPACE", "l2")  # "cosine" | "ip" | "l2"
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "10"))
+
 # Strict RAG Thresholds
 RELEVANCE_THRESHOLD = 0.60
 SIGMOID_MIDPOINT = 0.68
 SIGMOID_STEEPNESS = 10
 
+# Batch Query Settings
+# Upper bound on concurrent LLM calls in StrictRAGAssistant.query_batch().
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+# Chat History Settings
+# Cap on messages kept in st.session_state (user + assistant turns).
+# At least 2, so the newest question and its answer are never trimmed.
+MAX_HISTORY_MESSAGES = max(2, int(os.getenv("MAX_HISTORY_MESSAGES", "50")))
+# Max chunk texts kept in the shared lazy-load cache (across sessions).
+CHUNK_TEXT_CACHE_ENTRIES = 256
+
 # UI Settings
 APP_TITLE = "AI-Driven OLED Assistant"
 APP_ICON = "⚛"  # Atom symbol - fits OLED/physics theme
@@ -4,12 +4,13 @@ Document pipeline for OLED Assistant.
 This module centralizes document loading, chunking, and ChromaDB lifecycle:
 - Reuse existing vector DB when present
 - Build a new vector DB from source documents when missing
+- Apply configurable HNSW index settings (metric, M, ef)
 """
 
 import glob
 import os
 import shutil
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import Docx2txtLoader, PyPDFLoader
@@ -100,24 +101,94 @@ def create_embeddings_model() -> HuggingFaceEmbeddings:
     )
 
 
+HNSW_SPACES = ("cosine", "ip", "l2")
+
+
+def hnsw_collection_metadata(
+    space: str = config.HNSW_SPACE,
+    m: int = config.HNSW_M,
+    construction_ef: int = config.HNSW_CONSTRUCTION_EF,
+    search_ef: int = config.HNSW_SEARCH_EF,
+) -> Dict[str, Any]:
+    """Build (and validate) Chroma collection metadata carrying the HNSW index settings."""
+    if space not in HNSW_SPACES:
+        raise ValueError(
+            f"Unsupported HNSW space: {space!r}. Expected one of {HNSW_SPACES}."
+        )
+    for name, value in (("M", m), ("construction_ef", construction_ef), ("search_ef", search_ef)):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"HNSW {name} must be a positive integer, got {value!r}.")
+    return {
+        "hnsw:space": space,
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+    }
+
+
+# Chroma's own defaults, used when a persisted collection has no hnsw:* keys.
+_CHROMA_HNSW_DEFAULTS = hnsw_collection_metadata(
+    space="l2", m=16, construction_ef=100, search_ef=10
+)
+
+
+def warn_on_hnsw_mismatch(
+    vectorstore: Chroma,
+    expected_metadata: Dict[str, Any],
+    persist_directory: str = config.DB_PATH,
+) -> None:
+    """
+    Log when a persisted collection was built with different HNSW settings.
+
+    All four settings (including search_ef) are read from the HNSW segment
+    when it is created; chromadb does not apply later collection.modify()
+    changes to an existing index, so the only way to change them is to
+    delete chroma_db and rebuild.
+
+    Diagnostic only: never raises, so it cannot trigger a DB rebuild.
+    """
+    try:
+        persisted = {**_CHROMA_HNSW_DEFAULTS, **(vectorstore._collection.metadata or {})}
+        mismatches = [
+            f"{key}={persisted[key]} (config: {value})"
+            for key, value in expected_metadata.items()
+            if persisted[key] != value
+        ]
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Could not compare persisted HNSW settings with config: %s", str(exc))
+        return
+    if mismatches:
+        logger.warning(
+            "Persisted ChromaDB HNSW settings differ from config: %s. "
+            "Keeping the persisted settings; delete %s to rebuild with config values.",
+            ", ".join(mismatches),
+            persist_directory,
+        )
+
+
 def create_vectorstore_with_chroma(
     docs,
     embeddings: Optional[HuggingFaceEmbeddings] = None,
     persist_directory: str = config.DB_PATH,
+    collection_metadata: Optional[Dict[str, Any]] = None,
 ) -> Chroma:
     """Create and persist ChromaDB from chunked documents."""
     if embeddings is None:
         embeddings = create_embeddings_model()
+    if collection_metadata is None:
+        collection_metadata = hnsw_collection_metadata()
 
     logger.info(
-        "Creating new ChromaDB at %s from %d chunks.",
+        "Creating new ChromaDB at %s from %d chunks (%s).",
         persist_directory,
         len(docs),
+        collection_metadata,
     )
     return Chroma.from_documents(
         documents=docs,
         embedding=embeddings,
         persist_directory=persist_directory,
+        collection_metadata=collection_metadata,
     )
 
 
@@ -144,11 +215,16 @@ def get_or_create_vectorstore(
     """
     Reuse existing ChromaDB when available; otherwise build a new one.
     """
+    # Validate HNSW config BEFORE touching the DB: a config error must fail
+    # loudly here, not be mistaken below for an incompatible DB and deleted.
+    hnsw_metadata = hnsw_collection_metadata()
+
     if embeddings is None:
         embeddings = create_embeddings_model()
 
     if os.path.exists(persist_directory) and os.listdir(persist_directory):
         logger.info("Found existing ChromaDB at %s. Trying to reuse it.", persist_directory)
+        vectorstore = None
         try:
             vectorstore = Chroma(
                 persist_directory=persist_directory,
@@ -157,8 +233,8 @@ def get_or_create_vectorstore(
             # Force a lightweight DB call to detect schema/version mismatch early.
             _ = vectorstore._collection.count()
             logger.info("Existing ChromaDB is compatible. Reusing persisted DB.")
-            return vectorstore
         except Exception as exc:  # noqa: BLE001
+            vectorstore = None
             error_text = str(exc)
             # Common mismatch symptom:
             # "OperationalError: no such column: collections.topic"
@@ -170,6 +246,11 @@ def get_or_create_vectorstore(
             # Remove incompatible persisted DB so we can rebuild cleanly.
             shutil.rmtree(persist_directory, ignore_errors=True)
 
+        if vectorstore is not None:
+            # Outside the try: a diagnostic must never lead to rmtree.
+            warn_on_hnsw_mismatch(vectorstore, hnsw_metadata, persist_directory)
+            return vectorstore
+
     logger.info(
         "ChromaDB not found at %s. Creating from documents in %s.",
         persist_directory,
@@ -2,17 +2,51 @@
 Strict RAG Engine for OLED Assistant
 Aligned with notebooks/OLED_assistant_v3_final.ipynb
 """
-import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from langchain_openai import ChatOpenAI
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
+from langchain.schema import Document
 
 import config
 from document_pipeline import create_embeddings_model, get_or_create_vectorstore
 from utils import logger
 
 
+def distances_to_similarities(distances, space="l2"):
+    """
+    Convert Chroma distances to similarities in [0, 1] for the given HNSW space.
+
+    Every space is mapped onto the same scale, so the sigmoid midpoint and
+    relevance threshold (tuned on "l2") give the same score whichever
+    metric the collection was built with.
+
+    Args:
+        distances: Array-like of Chroma distances (any shape).
+        space: Collection's "hnsw:space" ("cosine", "ip" or "l2").
+
+    Returns:
+        np.ndarray: Similarities with the same shape as `distances`.
+    """
+    distances = np.asarray(distances, dtype=float)
+    if space == "l2":
+        # Legacy conversion the sigmoid midpoint/threshold were tuned on:
+        #   sim = 1 - (d^2)/2
+        # (Chroma's "l2" is already squared L2, so this is not exact cosine.)
+        squared_l2 = distances
+    elif space in ("cosine", "ip"):
+        # cosine: d = 1 - cos;  ip: d = 1 - dot (== cos for normalized embeddings)
+        # For normalized embeddings squared L2 = 2 * (1 - cos), so rescale to
+        # the l2 distance before applying the legacy conversion.
+        squared_l2 = 2.0 * distances
+    else:
+        raise ValueError(f"Unsupported HNSW space: {space!r}")
+    return np.clip(1.0 - np.square(squared_l2) / 2.0, 0.0, 1.0)
+
+
 def create_llm(model_name: str, temperature: float):
     """
     Create OpenAI-compatible chat model for cloud deployment.
@@ -70,6 +104,9 @@ class StrictRAGAssistant:
         Signature aligned with OLED_assistant_v3_final.ipynb.
         """
         self.vectorstore = vectorstore
+        # Read the metric from the collection itself: a persisted DB keeps the
+        # space it was built with even if config.HNSW_SPACE changes later.
+        self.distance_space = (vectorstore._collection.metadata or {}).get("hnsw:space", "l2")
         self.relevance_threshold = relevance_threshold
         self.top_k = top_k
         self.sigmoid_midpoint = sigmoid_midpoint
@@ -100,10 +137,10 @@ Answer:"""
             input_variables=["context", "question"]
         )
         
-        # NOTE: return_source_documents=True lets the chain return BOTH the
-        # generated answer and the retrieved Document objects in a single call.
-        # This avoids a redundant second similarity_search just to display
-        # provenance in the UI.
+        # NOTE: query()/query_batch() retrieve once via _search_batch() and
+        # reuse rag_chain.combine_documents_chain for generation, so the docs
+        # that drive the relevance gate are exactly the docs the LLM sees.
+        # The full chain is kept for notebook-style callers.
         self.rag_chain = RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
@@ -112,34 +149,63 @@ Answer:"""
             return_source_documents=True,
         )
 
+    def _similarities(self, distances):
+        """Convert Chroma distances (any shape) to similarities in [0, 1]."""
+        return distances_to_similarities(distances, self.distance_space)
+
+    def _sigmoid_relevance(self, distances):
+        """
+        Vectorized relevance gate.
+
+        Args:
+            distances: Chroma distances shaped (n_queries, k).
+
+        Returns:
+            np.ndarray: Sigmoid relevance score per query, shape (n_queries,).
+        """
+        distances = np.asarray(distances, dtype=float)
+        if distances.ndim != 2 or distances.shape[1] == 0:
+            return np.zeros(len(distances))
+
+        avg_scores = self._similarities(distances).mean(axis=1)
+
+        # Sigmoid transformation
+        return 1.0 / (1.0 + np.exp(-self.sigmoid_steepness * (avg_scores - self.sigmoid_midpoint)))
+
     def get_relevance_score(self, query):
         """Calculate relevance score using sigmoid transformation."""
-        docs_with_scores = self.vectorstore.similarity_search_with_score(query, k=self.top_k)
-        if not docs_with_scores:
-            return 0.0
-        
-        # Chroma returns L2 distance (lower is better). Convert to similarity.
-        # For normalized embeddings, L2 distance relates to cosine similarity:
-        #   sim = 1 - (d^2)/2  (then clamp to [0, 1])
-        scores = []
-        for _, d in docs_with_scores:
-            sim = 1.0 - (float(d) * float(d)) / 2.0
-            scores.append(max(0.0, min(1.0, sim)))
-        avg_score = sum(scores) / len(scores)
-        
-        # Sigmoid transformation
-        sigmoid_score = 1 / (1 + math.exp(-self.sigmoid_steepness * (avg_score - self.sigmoid_midpoint)))
-        return sigmoid_score
+        # Same retrieval path as query()/query_batch(), so callers can't disagree.
+        distances, _ = self._search_batch([query])
+        return float(self._sigmoid_relevance(distances)[0])
+
+    def _apply_answer_check(self, result, rag_response):
+        """Store the LLM answer, downgrading to NO_ANSWER_IN_DOCS when it declines."""
+        result["answer"] = rag_response
+
+        # Check for "Information not found" response from LLM
+        if "Information not found" in rag_response or ("provided context" in rag_response and "does not contain" in rag_response):
+            result["mode"] = "NO_ANSWER_IN_DOCS"
+            result["answer"] = "No Answer: The relevant content is not found in RAG documents."
+            logger.info("❌ Documents found but LLM could not find answer in context.")
+
+    def _reject_off_topic(self, result):
+        """Fill result for a question that failed the relevance gate."""
+        logger.info(f"🚫 Low relevance ({result['relevance_score']:.3f}). Rejecting.")
+        result["mode"] = "OFF_TOPIC"
+        result["answer"] = "No Answer: The question is not related to OLED display or relevant documents are not available."
 
     def query(self, question):
         """Process query through Strict RAG logic."""
-        relevance_score = self.get_relevance_score(question)
+        search_start = time.time()
+        distances, docs_per_question = self._search_batch([question])
+        relevance_score = float(self._sigmoid_relevance(distances)[0])
         
         result = {
             "answer": None,
             "mode": None,
             "relevance_score": relevance_score,
-            "retrieved_docs": []
+            "retrieved_docs": [],
+            "timings": {"retrieval_time": time.time() - search_start, "llm_time": 0.0},
         }
         
         # Check relevance threshold
@@ -147,28 +213,150 @@ Answer:"""
             logger.info(f"✅ High relevance ({relevance_score:.3f}). Executing RAG.")
             result["mode"] = "RAG"
 
-            # Execute Chain ONCE: it returns the answer AND the source docs the
-            # LLM actually saw. We use those same docs to render provenance in
-            # the UI, so users see exactly what the model was grounded on.
-            try:
-                chain_response = self.rag_chain.invoke({"query": question})
-                rag_response = chain_response["result"]
-                result["answer"] = rag_response
-                result["retrieved_docs"] = chain_response.get("source_documents", [])
-
-                # Check for "Information not found" response from LLM
-                if "Information not found" in rag_response or ("provided context" in rag_response and "does not contain" in rag_response):
-                    result["mode"] = "NO_ANSWER_IN_DOCS"
-                    result["answer"] = "No Answer: The relevant content is not found in RAG documents."
-                    logger.info("❌ Documents found but LLM could not find answer in context.")
-
-            except Exception as e:
-                logger.error(f"RAG Chain execution failed: {str(e)}")
-                result["answer"] = "Error processing request."
+            # Retrieve ONCE: the same docs drive the relevance gate, the LLM
+            # context, and the provenance shown in the UI, so users see exactly
+            # what the model was grounded on.
+            result["retrieved_docs"] = docs_per_question[0]
+            self._generate_answer(result, question, docs_per_question[0])
                 
         else:
-            logger.info(f"🚫 Low relevance ({relevance_score:.3f}). Rejecting.")
-            result["mode"] = "OFF_TOPIC"
-            result["answer"] = "No Answer: The question is not related to OLED display or relevant documents are not available."
+            self._reject_off_topic(result)
             
         return result
+
+    def _search_batch(self, questions):
+        """
+        Embed a batch of questions in one call and search Chroma with one
+        multi-query request.
+
+        Each returned Document carries its Chroma ID and similarity in
+        metadata["chunk_id"] / metadata["score"] for lightweight provenance.
+
+        Returns:
+            tuple: (distances, docs_per_question) aligned with `questions`.
+        """
+        query_embeddings = self.vectorstore.embeddings.embed_documents(questions)
+        response = self.vectorstore._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=self.top_k,
+            include=["documents", "metadatas", "distances"],
+        )
+
+        docs_per_question = []
+        for ids, texts, metadatas, distances in zip(
+            response["ids"], response["documents"], response["metadatas"], response["distances"]
+        ):
+            scores = self._similarities(distances)
+            docs_per_question.append([
+                Document(
+                    page_content=text,
+                    metadata={**(metadata or {}), "chunk_id": chunk_id, "score": float(score)},
+                )
+                for chunk_id, text, metadata, score in zip(ids, texts, metadatas, scores)
+            ])
+        return response["distances"], docs_per_question
+
+    def get_chunk_text(self, chunk_id):
+        """Fetch a single chunk's text from the vector store by ID ("" if missing)."""
+        response = self.vectorstore._collection.get(ids=[chunk_id], include=["documents"])
+        documents = response.get("documents") or []
+        return documents[0] if documents else ""
+
+    def _generate_answer(self, result, question, docs):
+        """
+        Run the stuff-documents step on already-retrieved docs (no re-retrieval).
+
+        Returns:
+            bool: False if the LLM call failed (recorded in `result`).
+        """
+        start_time = time.time()
+        try:
+            # Same prompt/LLM as rag_chain, minus its retriever: _search_batch()
+            # already fetched exactly these top_k chunks.
+            rag_response = self.rag_chain.combine_documents_chain.invoke(
+                {"input_documents": docs, "question": question}
+            )["output_text"]
+            self._apply_answer_check(result, rag_response)
+            succeeded = True
+        except Exception as e:
+            logger.error(f"RAG Chain execution failed: {str(e)}")
+            result["answer"] = "Error processing request."
+            succeeded = False
+        result["timings"]["llm_time"] = time.time() - start_time
+        return succeeded
+
+    def query_batch(self, questions, max_workers=config.LLM_MAX_CONCURRENCY):
+        """
+        Process many questions through Strict RAG logic.
+
+        Questions are embedded and searched in EMBEDDING_BATCH_SIZE batches,
+        gated with the vectorized sigmoid, and only RAG-mode questions are
+        sent to the LLM (at most `max_workers` calls in flight).
+
+        Args:
+            questions: Iterable of question strings.
+            max_workers: Upper bound on concurrent LLM calls.
+
+        Returns:
+            dict: {
+                "results": per-question dicts (same keys as query() plus
+                           "question"), in input order,
+                "total_time": wall-clock seconds for the whole batch,
+                "throughput": questions per second,
+                "failed": number of RAG questions whose LLM call failed,
+            }
+        """
+        questions = list(questions)
+        batch_start = time.time()
+        results = []
+        rag_jobs = []
+
+        batch_size = config.EMBEDDING_BATCH_SIZE
+        for start in range(0, len(questions), batch_size):
+            batch = questions[start:start + batch_size]
+            search_start = time.time()
+            distances, docs_per_question = self._search_batch(batch)
+            relevance_scores = self._sigmoid_relevance(distances)
+            # One search serves the whole batch; attribute it evenly.
+            retrieval_time = (time.time() - search_start) / len(batch)
+
+            for question, docs, relevance_score in zip(batch, docs_per_question, relevance_scores):
+                result = {
+                    "question": question,
+                    "answer": None,
+                    "mode": None,
+                    "relevance_score": float(relevance_score),
+                    "retrieved_docs": [],
+                    "timings": {"retrieval_time": retrieval_time, "llm_time": 0.0},
+                }
+                if relevance_score >= self.relevance_threshold:
+                    logger.info(f"✅ High relevance ({relevance_score:.3f}). Queued for RAG.")
+                    result["mode"] = "RAG"
+                    result["retrieved_docs"] = docs
+                    rag_jobs.append((result, question, docs))
+                else:
+                    self._reject_off_topic(result)
+                results.append(result)
+
+        failed = 0
+        if rag_jobs:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                # _generate_answer() records LLM failures on the item itself
+                # ("Error processing request."); count them for the summary.
+                outcomes = executor.map(lambda job: self._generate_answer(*job), rag_jobs)
+                failed = sum(1 for succeeded in outcomes if not succeeded)
+
+        total_time = time.time() - batch_start
+        throughput = len(questions) / total_time if total_time > 0 else 0.0
+        logger.info(
+            f"Batch query: {len(questions)} questions ({len(rag_jobs)} RAG, {failed} failed) "
+            f"in {total_time:.2f}s ({throughput:.2f} q/s)."
+        )
+        if failed:
+            logger.warning(f"Batch query: {failed}/{len(rag_jobs)} LLM calls failed.")
+        return {
+            "results": results,
+            "total_time": total_time,
+            "throughput": throughput,
+            "failed": failed,
+        }
@@ -0,0 +1,189 @@
+"""
+HNSW tuning tool for OLED Assistant.
+
+Compares ChromaDB HNSW settings (metric, M, construction_ef, search_ef) on
+the embeddings already stored in the persisted vector DB:
+- recall@k against exact brute-force search with the same metric
+- mean / p95 query latency
+- index build time
+
+Queries come from --queries-file (one question per line; closest to the real
+workload of short questions against long chunks). Without it, stored chunk
+embeddings are sampled as queries and held out of the index, so no query
+can trivially match itself.
+
+Usage:
+    python src/tune_hnsw.py
+    python src/tune_hnsw.py --spaces cosine l2 --m 8 16 32 --search-ef 10 50 100
+    python src/tune_hnsw.py --queries-file questions.txt --output hnsw_tuning.csv
+"""
+
+import argparse
+import csv
+import itertools
+import time
+import uuid
+
+import chromadb
+import numpy as np
+
+import config
+from document_pipeline import (
+    HNSW_SPACES,
+    create_embeddings_model,
+    get_or_create_vectorstore,
+    hnsw_collection_metadata,
+)
+from utils import logger
+
+ADD_BATCH_SIZE = 5000
+
+
+def load_corpus(vectorstore):
+    """Return (ids, embeddings) of every chunk in the persisted collection."""
+    response = vectorstore._collection.get(include=["embeddings"])
+    return response["ids"], np.asarray(response["embeddings"], dtype=np.float32)
+
+
+def load_queries(args, ids, corpus_embeddings, embeddings_model):
+    """
+    Embed questions from --queries-file, or sample stored chunk embeddings.
+
+    Returns:
+        tuple: (index_ids, index_embeddings, query_embeddings). Sampled
+        query chunks are removed from the index set; otherwise each query's
+        exact nearest neighbour would be itself at distance 0.
+    """
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        if not questions:
+            raise SystemExit(f"No questions found in {args.queries_file}.")
+        logger.info("Embedding %d questions from %s.", len(questions), args.queries_file)
+        query_embeddings = np.asarray(embeddings_model.embed_documents(questions), dtype=np.float32)
+        return ids, corpus_embeddings, query_embeddings
+
+    rng = np.random.default_rng(args.seed)
+    # Keep at least one chunk in the index.
+    n_queries = min(args.num_queries, len(corpus_embeddings) - 1)
+    if n_queries < 1:
+        raise SystemExit("Need at least 2 stored chunks to sample held-out queries; use --queries-file.")
+    logger.info("Sampling %d stored chunk embeddings as held-out queries.", n_queries)
+    query_mask = np.zeros(len(corpus_embeddings), dtype=bool)
+    query_mask[rng.choice(len(corpus_embeddings), size=n_queries, replace=False)] = True
+    index_ids = [chunk_id for chunk_id, is_query in zip(ids, query_mask) if not is_query]
+    return index_ids, corpus_embeddings[~query_mask], corpus_embeddings[query_mask]
+
+
+def exact_top_k(corpus_embeddings, query_embeddings, k, space):
+    """Brute-force top-k corpus indices per query, using Chroma's distance for `space`."""
+    if space == "l2":
+        distances = (
+            np.square(query_embeddings).sum(axis=1, keepdims=True)
+            - 2.0 * query_embeddings @ corpus_embeddings.T
+            + np.square(corpus_embeddings).sum(axis=1)
+        )
+    elif space == "ip":
+        distances = 1.0 - query_embeddings @ corpus_embeddings.T
+    else:
+        corpus_norm = corpus_embeddings / np.linalg.norm(corpus_embeddings, axis=1, keepdims=True)
+        query_norm = query_embeddings / np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+        distances = 1.0 - query_norm @ corpus_norm.T
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def evaluate_setting(client, ids, corpus_embeddings, query_embeddings, exact_ids, k, metadata):
+    """Build one in-memory index with `metadata` and measure recall@k and latency."""
+    collection = client.create_collection(name=f"tune_{uuid.uuid4().hex[:12]}", metadata=metadata)
+    try:
+        build_start = time.perf_counter()
+        for start in range(0, len(ids), ADD_BATCH_SIZE):
+            end = start + ADD_BATCH_SIZE
+            collection.add(ids=ids[start:end], embeddings=corpus_embeddings[start:end].tolist())
+        build_time = time.perf_counter() - build_start
+
+        latencies = []
+        recalls = []
+        for query, expected in zip(query_embeddings, exact_ids):
+            query_start = time.perf_counter()
+            response = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+            latencies.append(time.perf_counter() - query_start)
+            recalls.append(len(set(response["ids"][0]) & expected) / k)
+    finally:
+        client.delete_collection(collection.name)
+
+    latencies_ms = np.asarray(latencies) * 1000.0
+    return {
+        "space": metadata["hnsw:space"],
+        "M": metadata["hnsw:M"],
+        "construction_ef": metadata["hnsw:construction_ef"],
+        "search_ef": metadata["hnsw:search_ef"],
+        f"recall@{k}": float(np.mean(recalls)),
+        "latency_mean_ms": float(latencies_ms.mean()),
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "build_time_s": build_time,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare ChromaDB HNSW settings (recall vs latency).")
+    parser.add_argument("--spaces", nargs="+", choices=HNSW_SPACES, default=[config.HNSW_SPACE])
+    parser.add_argument("--m", nargs="+", type=int, default=[8, 16, 32])
+    parser.add_argument("--construction-ef", nargs="+", type=int, default=[100, 200])
+    parser.add_argument("--search-ef", nargs="+", type=int, default=[10, 50, 100])
+    parser.add_argument("--k", type=int, default=config.TOP_K_DOCUMENTS)
+    parser.add_argument("--queries-file", help="Text file with one question per line.")
+    parser.add_argument(
+        "--num-queries", type=int, default=200, help="Held-out chunk queries when no --queries-file."
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Optional CSV path for the results table.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    embeddings_model = create_embeddings_model()
+    vectorstore = get_or_create_vectorstore(embeddings=embeddings_model)
+    ids, corpus_embeddings = load_corpus(vectorstore)
+    if not ids:
+        raise SystemExit("The persisted ChromaDB collection is empty; nothing to tune.")
+    ids, corpus_embeddings, query_embeddings = load_queries(
+        args, ids, corpus_embeddings, embeddings_model
+    )
+    k = min(args.k, len(ids))
+    logger.info("Tuning on %d chunks, %d queries, k=%d.", len(ids), len(query_embeddings), k)
+
+    client = chromadb.EphemeralClient()
+    rows = []
+    for space in args.spaces:
+        exact_ids = [
+            {ids[i] for i in row}
+            for row in exact_top_k(corpus_embeddings, query_embeddings, k, space)
+        ]
+        for m, construction_ef, search_ef in itertools.product(
+            args.m, args.construction_ef, args.search_ef
+        ):
+            metadata = hnsw_collection_metadata(
+                space=space, m=m, construction_ef=construction_ef, search_ef=search_ef
+            )
+            row = evaluate_setting(client, ids, corpus_embeddings, query_embeddings, exact_ids, k, metadata)
+            logger.info("%s", row)
+            rows.append(row)
+
+    header = list(rows[0].keys())
+    print(" | ".join(header))
+    for row in rows:
+        print(" | ".join(f"{v:.4f}" if isinstance(v, float) else str(v) for v in row.values()))
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(rows)
+        logger.info("Saved tuning results to %s.", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import logging
 import os
+import sys
 import time
 from datetime import datetime
 import config
@@ -29,3 +30,28 @@ def format_time(seconds):
     if seconds < 1:
         return f"{seconds*1000:.0f}ms"
     return f"{seconds:.2f}s"
+
+def deep_getsizeof(obj, seen=None):
+    """Approximate memory footprint (bytes) of an object graph."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_getsizeof(k, seen) + deep_getsizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_getsizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_getsizeof(vars(obj), seen)
+    return size
+
+def format_bytes(num_bytes):
+    """Format a byte count into readable string."""
+    if num_bytes < 1024:
+        return f"{num_bytes} B"
+    if num_bytes < 1024 * 1024:
+        return f"{num_bytes / 1024:.1f} KB"
+    return f"{num_bytes / (1024 * 1024):.2f} MB"